@@ -1,5 +1,6 @@
 """FastAPI application for the Self-RAG pipeline."""
 
+import asyncio
 import logging
 import time
 from contextlib import asynccontextmanager
@@ -8,8 +9,16 @@ from typing import List, Optional
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
 
-from app.config import GRAPH_RECURSION_LIMIT
+from app.config import (
+    GRAPH_RECURSION_LIMIT,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_THRESHOLD,
+    embeddings,
+)
 from app.graph import build_graph
+from app.routing import get_centroids
+from app.semantic_cache import SemanticCache
+from app.vectorstore import get_vector_store
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(name)s | %(message)s")
 logger = logging.getLogger(__name__)
@@ -17,6 +26,11 @@ logger = logging.getLogger(__name__)
 # ── Compiled graph (loaded on startup) ───────────────────────────────────────
 _app_graph = None
 
+# ── Semantic response cache (question embedding → AskResponse) ───────────────
+_semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD, max_size=SEMANTIC_CACHE_SIZE
+)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -24,6 +38,15 @@ async def lifespan(app: FastAPI):
     global _app_graph
     logger.info("Building Self-RAG graph...")
     _app_graph = build_graph()
+    # The async nodes would otherwise do this blocking first-use work (index
+    # read + unpickle, example embedding calls) on the event loop
+    for warm_up in (get_vector_store, get_centroids):
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            logger.warning(
+                "%s failed at startup, retrying on first use: %s", warm_up.__name__, e
+            )
     logger.info("Self-RAG graph ready.")
     yield
 
@@ -56,6 +79,7 @@ class AskResponse(BaseModel):
     is_use: Optional[str] = None
     use_reason: Optional[str] = None
     rewrite_tries: int = 0
+    cache_hit: bool = False
     elapsed_seconds: float = 0.0
 
 
@@ -64,7 +88,11 @@ class AskResponse(BaseModel):
 
 @api.get("/health")
 async def health():
-    return {"status": "ok", "graph_loaded": _app_graph is not None}
+    return {
+        "status": "ok",
+        "graph_loaded": _app_graph is not None,
+        "semantic_cache_entries": len(_semantic_cache),
+    }
 
 
 @api.post("/ask", response_model=AskResponse)
@@ -72,6 +100,22 @@ async def ask(request: AskRequest):
     if _app_graph is None:
         raise HTTPException(status_code=503, detail="Graph not loaded yet.")
 
+    start = time.time()
+
+    # Short-circuit repeated or paraphrased questions
+    query_vector = None
+    if SEMANTIC_CACHE_SIZE > 0:
+        query_vector = await embeddings.aembed_query(request.question)
+        cached = _semantic_cache.lookup(query_vector)
+        if cached is not None:
+            return cached.model_copy(
+                update={
+                    "question": request.question,
+                    "cache_hit": True,
+                    "elapsed_seconds": round(time.time() - start, 2),
+                }
+            )
+
     initial_state = {
         "question": request.question,
         "retrieval_query": "",
@@ -83,12 +127,14 @@ async def ask(request: AskRequest):
         "is_supported": "",
         "evidence": [],
         "retries": 0,
+        "prev_is_supported": "",
+        "prev_answer_hash": "",
         "is_use": "",
         "use_reason": "",
     }
 
-    start = time.time()
-    result = _app_graph.invoke(
+    # ainvoke runs the nodes' async twins, which await OpenAI on the event loop
+    result = await _app_graph.ainvoke(
         initial_state, config={"recursion_limit": GRAPH_RECURSION_LIMIT}
     )
     elapsed = time.time() - start
@@ -105,7 +151,7 @@ async def ask(request: AskRequest):
             }
         )
 
-    return AskResponse(
+    response = AskResponse(
         question=request.question,
         answer=result.get("answer", ""),
         need_retrieval=result.get("need_retrieval"),
@@ -120,3 +166,6 @@ async def ask(request: AskRequest):
         rewrite_tries=result.get("rewrite_tries", 0),
         elapsed_seconds=round(elapsed, 2),
     )
+    if query_vector is not None:
+        _semantic_cache.add(query_vector, response)
+    return response
@@ -0,0 +1,57 @@
+"""Embeddings wrapper that memoizes query embeddings in-process."""
+
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Delegate to ``base`` but LRU-cache query embeddings by the raw query string.
+
+    Document embedding is passed straight through — only queries repeat
+    (rewrite loops, identical /ask questions, cache lookups). ``embed_query``
+    and ``aembed_query`` share one cache, so a miss in either fills it for both.
+    """
+
+    def __init__(self, base: Embeddings, maxsize: int = 4096):
+        self.base = base
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, text: str) -> Optional[Tuple[float, ...]]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+            return vector
+
+    def _store(self, text: str, vector: List[float]) -> Tuple[float, ...]:
+        # Tuples so cached vectors can't be mutated by callers
+        vector = tuple(vector)
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.base.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._lookup(text)
+        if vector is None:
+            vector = self._store(text, self.base.embed_query(text))
+        return list(vector)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._lookup(text)
+        if vector is None:
+            vector = self._store(text, await self.base.aembed_query(text))
+        return list(vector)
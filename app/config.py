@@ -4,8 +4,12 @@ import os
 import warnings
 from pathlib import Path
 
+import httpx
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from app.cached_embeddings import CachedQueryEmbeddings
 
 load_dotenv()
 warnings.filterwarnings("ignore")
@@ -15,6 +19,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 PDF_DIR = DATA_DIR / "pdfs"
 VECTORSTORE_DIR = DATA_DIR / "vectorstore"
+CACHE_DIR = DATA_DIR / "cache"
 
 PDF_FILES = [
     PDF_DIR / "policies.pdf",
@@ -28,17 +33,86 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
 
 # ── Retriever ────────────────────────────────────────────────────────────────
 TOP_K = int(os.getenv("TOP_K", "4"))
+# Cosine-similarity bands: docs at/above ACCEPT skip LLM grading as relevant,
+# docs below REJECT are dropped without grading
+RELEVANCE_ACCEPT_SCORE = float(os.getenv("RELEVANCE_ACCEPT_SCORE", "0.75"))
+RELEVANCE_REJECT_SCORE = float(os.getenv("RELEVANCE_REJECT_SCORE", "0.3"))
+
+# ── Reranker (optional, needs sentence-transformers) ─────────────────────────
+# Cross-encoder model name, e.g. "BAAI/bge-reranker-base"; empty disables
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.5"))
+
+# ── Vector index ─────────────────────────────────────────────────────────────
+# PQ distances are approximate; the RFlat stage re-scores candidates exactly so
+# relevance_score stays comparable to the grading thresholds
+FAISS_INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY", "IVF64,PQ16x4fsr,RFlat")
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+# Candidates per result the PQ stage hands to the exact refine stage
+FAISS_REFINE_K_FACTOR = float(os.getenv("FAISS_REFINE_K_FACTOR", "4"))
 
 # ── Models ───────────────────────────────────────────────────────────────────
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+# Truncated (Matryoshka) output size; 0 = native. Only text-embedding-3 models
+# accept it, so other models default to native
+EMBEDDING_DIMENSIONS = int(
+    os.getenv(
+        "EMBEDDING_DIMENSIONS",
+        "512" if EMBEDDING_MODEL.startswith("text-embedding-3") else "0",
+    )
+) or None
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+
+# ── Retrieval router ─────────────────────────────────────────────────────────
+# Min cosine margin between the retrieve/direct centroids to skip the LLM
+# decision (>= 2 always defers to the LLM)
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.1"))
 
 # ── Self-RAG limits ──────────────────────────────────────────────────────────
 MAX_HALLUCINATION_RETRIES = int(os.getenv("MAX_HALLUCINATION_RETRIES", "5"))
 MAX_QUERY_REWRITES = int(os.getenv("MAX_QUERY_REWRITES", "3"))
 GRAPH_RECURSION_LIMIT = int(os.getenv("GRAPH_RECURSION_LIMIT", "80"))
 
+# ── Semantic cache ───────────────────────────────────────────────────────────
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "10000"))
+
+# ── LLM response cache (eval runners only) ───────────────────────────────────
+# Set SELFRAG_LLM_CACHE=0 to always call the API (e.g. for A/B experiments)
+LLM_CACHE_ENABLED = os.getenv("SELFRAG_LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = CACHE_DIR / "llm_cache.sqlite"
+
+# ── HTTP connection pool ─────────────────────────────────────────────────────
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "50"))
+
 # ── Singleton instances ──────────────────────────────────────────────────────
-llm = ChatOpenAI(model=LLM_MODEL, temperature=LLM_TEMPERATURE)
-embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+# One HTTP/2 pool per sync/async flavour, shared by the LLM and the embeddings
+# so concurrent fan-out calls multiplex over warm connections
+_http_limits = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+)
+http_client = DefaultHttpxClient(http2=True, limits=_http_limits)
+http_async_client = DefaultAsyncHttpxClient(http2=True, limits=_http_limits)
+
+llm = ChatOpenAI(
+    model=LLM_MODEL,
+    temperature=LLM_TEMPERATURE,
+    http_client=http_client,
+    http_async_client=http_async_client,
+)
+embeddings = CachedQueryEmbeddings(
+    OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        dimensions=EMBEDDING_DIMENSIONS,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    ),
+    maxsize=EMBED_CACHE_SIZE,
+)
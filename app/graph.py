@@ -1,16 +1,22 @@
 """Build and compile the Self-RAG LangGraph."""
 
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import END, START, StateGraph
 
 from app.models import State
 from app.nodes import (
     accept_answer,
+    adecide_retrieval,
+    aevaluate_answer,
+    agenerate_direct,
+    agrade_and_generate,
+    aretrieve,
+    arevise_answer,
+    arewrite_question,
     decide_retrieval,
+    evaluate_answer,
     generate_direct,
-    generate_from_context,
-    is_relevant,
-    is_supported,
-    is_use,
+    grade_and_generate,
     no_answer_found,
     retrieve,
     revise_answer,
@@ -27,16 +33,19 @@ def build_graph():
     g = StateGraph(State)
 
     # ── Nodes ────────────────────────────────────────────────────────────
-    g.add_node("decide_retrieval", decide_retrieval)
-    g.add_node("generate_direct", generate_direct)
-    g.add_node("retrieve", retrieve)
-    g.add_node("is_relevant", is_relevant)
-    g.add_node("generate_from_context", generate_from_context)
+    # I/O nodes pair a sync and an async implementation: graph.invoke runs
+    # the first, graph.ainvoke/astream await the second
+    g.add_node("decide_retrieval", RunnableLambda(decide_retrieval, afunc=adecide_retrieval))
+    g.add_node("generate_direct", RunnableLambda(generate_direct, afunc=agenerate_direct))
+    g.add_node("retrieve", RunnableLambda(retrieve, afunc=aretrieve))
+    g.add_node(
+        "grade_and_generate", RunnableLambda(grade_and_generate, afunc=agrade_and_generate)
+    )
     g.add_node("no_answer_found", no_answer_found)
-    g.add_node("is_supported", is_supported)
-    g.add_node("revise_answer", revise_answer)
-    g.add_node("is_use", is_use)
-    g.add_node("rewrite_question", rewrite_question)
+    g.add_node("evaluate_answer", RunnableLambda(evaluate_answer, afunc=aevaluate_answer))
+    g.add_node("revise_answer", RunnableLambda(revise_answer, afunc=arevise_answer))
+    g.add_node("accept_answer", accept_answer)
+    g.add_node("rewrite_question", RunnableLambda(rewrite_question, afunc=arewrite_question))
 
     # ── Edges ────────────────────────────────────────────────────────────
     g.add_edge(START, "decide_retrieval")
@@ -48,27 +57,27 @@ def build_graph():
     )
     g.add_edge("generate_direct", END)
 
-    g.add_edge("retrieve", "is_relevant")
+    g.add_edge("retrieve", "grade_and_generate")
     g.add_conditional_edges(
-        "is_relevant",
+        "grade_and_generate",
         route_after_relevance,
         {
-            "generate_from_context": "generate_from_context",
+            "evaluate_answer": "evaluate_answer",
             "no_answer_found": "no_answer_found",
         },
     )
     g.add_edge("no_answer_found", END)
 
-    g.add_edge("generate_from_context", "is_supported")
     g.add_conditional_edges(
-        "is_supported",
+        "evaluate_answer",
         route_after_issupported,
-        {"accept_answer": "is_use", "revise_answer": "revise_answer"},
+        {"accept_answer": "accept_answer", "revise_answer": "revise_answer"},
     )
-    g.add_edge("revise_answer", "is_supported")
+    g.add_edge("revise_answer", "evaluate_answer")
 
+    # IsUSE was already graded alongside IsSUP; just route on it
     g.add_conditional_edges(
-        "is_use",
+        "accept_answer",
         route_after_isuse,
         {
             "END": END,
@@ -0,0 +1,62 @@
+"""Persistent LLM response cache for repeated (e.g. eval) runs."""
+
+import logging
+import threading
+from typing import Optional
+
+from langchain_community.cache import SQLiteCache
+from langchain_core.globals import set_llm_cache
+from sqlalchemy.exc import IntegrityError
+
+from app.config import LLM_CACHE_ENABLED, LLM_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class CountingSQLiteCache(SQLiteCache):
+    """SQLiteCache that counts lookups, so runners can report the hit rate.
+
+    Entries are keyed by the serialized prompt and the model parameters
+    (model name, temperature, response format), so any config change misses.
+    """
+
+    def __init__(self, database_path: str):
+        super().__init__(database_path=database_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt: str, llm_string: str):
+        result = super().lookup(prompt, llm_string)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        try:
+            super().update(prompt, llm_string, return_val)
+        except IntegrityError:
+            # A concurrent worker missed on the same prompt and stored it first
+            pass
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "N/A"
+        return f"{self.hits}/{total} hits ({rate})"
+
+
+def install_llm_cache() -> Optional[CountingSQLiteCache]:
+    """Route every LangChain chat model call through the SQLite cache.
+
+    Returns None (and installs nothing) when SELFRAG_LLM_CACHE=0.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    LLM_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    cache = CountingSQLiteCache(database_path=str(LLM_CACHE_PATH))
+    set_llm_cache(cache)
+    logger.info("LLM response cache at %s", LLM_CACHE_PATH)
+    return cache
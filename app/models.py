@@ -18,6 +18,9 @@ class State(TypedDict):
     is_supported: Literal["fully_supported", "partially_supported", "not_supported"]
     evidence: List[str]
     retries: int
+    # Verdict and answer hash from before the latest revision (stall detection)
+    prev_is_supported: str
+    prev_answer_hash: str
     # Usefulness evaluation
     is_use: Literal["useful", "not_useful"]
     use_reason: str
@@ -34,10 +37,14 @@ class RetrieveDecision(BaseModel):
     )
 
 
-class RelevanceDecision(BaseModel):
-    is_relevant: bool = Field(
+class FusedRagDecision(BaseModel):
+    relevant_ids: List[int] = Field(
+        default_factory=list,
+        description="Numbers of the documents that help answer the question.",
+    )
+    answer: str = Field(
         ...,
-        description="True if the document helps answer the question, False otherwise.",
+        description="Answer grounded only in the documents listed in relevant_ids.",
     )
 
 
@@ -1,14 +1,26 @@
 """All LangGraph node functions and routing functions for the Self-RAG pipeline."""
 
-from typing import List, Literal
+import asyncio
+import hashlib
+from typing import List, Literal, Tuple
 
 from langchain_core.documents import Document
-
-from app.config import MAX_HALLUCINATION_RETRIES, MAX_QUERY_REWRITES, llm
+from langchain_core.runnables import RunnableParallel
+
+from app.config import (
+    MAX_HALLUCINATION_RETRIES,
+    MAX_QUERY_REWRITES,
+    RELEVANCE_ACCEPT_SCORE,
+    RELEVANCE_REJECT_SCORE,
+    RERANK_FETCH_K,
+    RERANK_MIN_SCORE,
+    RERANKER_MODEL,
+    llm,
+)
 from app.models import (
+    FusedRagDecision,
     IsSupportedDecision,
     IsUSEDecision,
-    RelevanceDecision,
     RetrieveDecision,
     RewriteDecision,
     State,
@@ -16,34 +28,70 @@ from app.models import (
 from app.prompts import (
     decide_retrieval_prompt,
     direct_generation_prompt,
-    is_relevant_prompt,
+    fused_rag_prompt,
     issup_prompt,
     isuse_prompt,
-    rag_generation_prompt,
     revise_prompt,
     rewrite_for_retrieval_prompt,
 )
-from app.vectorstore import get_retriever
+from app.routing import aclassify_retrieval, classify_retrieval
+from app.vectorstore import asearch, rerank, search
 
 # ── Structured-output LLM wrappers ──────────────────────────────────────────
-should_retrieve_llm = llm.with_structured_output(RetrieveDecision)
-relevance_llm = llm.with_structured_output(RelevanceDecision)
-issup_llm = llm.with_structured_output(IsSupportedDecision)
-isuse_llm = llm.with_structured_output(IsUSEDecision)
-rewrite_llm = llm.with_structured_output(RewriteDecision)
+# OpenAI JSON mode + Pydantic parsing: cheaper than the default tool-calling
+# method (no function schema in the request). Every prompt must therefore
+# mention JSON and spell out the expected keys.
+def _json_llm(schema):
+    return llm.with_structured_output(schema, method="json_mode")
+
+
+should_retrieve_llm = _json_llm(RetrieveDecision)
+fused_rag_llm = _json_llm(FusedRagDecision)
+issup_llm = _json_llm(IsSupportedDecision)
+isuse_llm = _json_llm(IsUSEDecision)
+rewrite_llm = _json_llm(RewriteDecision)
+
+# IsUSE only depends on (question, answer), so it is graded speculatively
+# alongside IsSUP instead of after it. Its verdict is simply overwritten if
+# the answer gets revised.
+answer_grader = RunnableParallel(
+    issup=issup_prompt | issup_llm,
+    isuse=isuse_prompt | isuse_llm,
+)
 
 
 # ── Node Functions ───────────────────────────────────────────────────────────
+# Nodes that call a model or the embeddings API have an ``a``-prefixed async
+# twin that awaits the same requests; app.graph registers both.
 
 
 def decide_retrieval(state: State):
-    """Decide whether external document retrieval is needed."""
+    """Decide whether external document retrieval is needed.
+
+    Clear-cut questions are routed by keyword match or embedding similarity;
+    only ambiguous ones cost an LLM call.
+    """
+    fast_decision = classify_retrieval(state["question"])
+    if fast_decision is not None:
+        return {"need_retrieval": fast_decision}
+
     decision: RetrieveDecision = should_retrieve_llm.invoke(
         decide_retrieval_prompt.format_messages(question=state["question"])
     )
     return {"need_retrieval": decision.should_retrieve}
 
 
+async def adecide_retrieval(state: State):
+    fast_decision = await aclassify_retrieval(state["question"])
+    if fast_decision is not None:
+        return {"need_retrieval": fast_decision}
+
+    decision: RetrieveDecision = await should_retrieve_llm.ainvoke(
+        decide_retrieval_prompt.format_messages(question=state["question"])
+    )
+    return {"need_retrieval": decision.should_retrieve}
+
+
 def generate_direct(state: State):
     """Answer using only LLM parametric knowledge (no retrieval)."""
     out = llm.invoke(
@@ -52,54 +100,142 @@ def generate_direct(state: State):
     return {"answer": out.content}
 
 
+async def agenerate_direct(state: State):
+    out = await llm.ainvoke(
+        direct_generation_prompt.format_messages(question=state["question"])
+    )
+    return {"answer": out.content}
+
+
 def retrieve(state: State):
-    """Retrieve top-k documents from the vector store."""
-    retriever = get_retriever()
+    """Retrieve top-k documents from the vector store.
+
+    With a reranker configured, over-fetch RERANK_FETCH_K candidates and let
+    the cross-encoder pick the top-k.
+    """
     q = state.get("retrieval_query") or state["question"]
-    return {"docs": retriever.invoke(q)}
+    if RERANKER_MODEL:
+        return {"docs": rerank(q, search(q, k=RERANK_FETCH_K))}
+    return {"docs": search(q)}
 
 
-def is_relevant(state: State):
-    """Filter retrieved documents for relevance to the question."""
-    relevant_docs: List[Document] = []
-    for doc in state["docs"]:
-        decision: RelevanceDecision = relevance_llm.invoke(
-            is_relevant_prompt.format_messages(
-                question=state["question"], document=doc.page_content
-            )
-        )
-        if decision.is_relevant:
-            relevant_docs.append(doc)
-    return {"relevant_docs": relevant_docs}
+async def aretrieve(state: State):
+    q = state.get("retrieval_query") or state["question"]
+    if RERANKER_MODEL:
+        candidates = await asearch(q, k=RERANK_FETCH_K)
+        # The cross-encoder is CPU-bound; keep it off the event loop
+        return {"docs": await asyncio.to_thread(rerank, q, candidates)}
+    return {"docs": await asearch(q)}
+
+
+def _format_numbered_docs(docs: List[Document]) -> str:
+    return "\n\n".join(f"[{i}] {doc.page_content}" for i, doc in enumerate(docs))
+
+
+def _split_by_score(docs: List[Document]) -> Tuple[List[Document], List[Document]]:
+    """Split docs into (auto-accepted, needs LLM grading); low scorers are dropped."""
+    accepted: List[Document] = []
+    uncertain: List[Document] = []
+    for doc in docs:
+        rerank_score = doc.metadata.get("rerank_score")
+        if rerank_score is not None:
+            # Cross-encoder verdicts are final; they never go to the LLM
+            if rerank_score >= RERANK_MIN_SCORE:
+                accepted.append(doc)
+            continue
+
+        score = doc.metadata.get("relevance_score")
+        if score is None:
+            uncertain.append(doc)
+        elif score >= RELEVANCE_ACCEPT_SCORE:
+            accepted.append(doc)
+        elif score >= RELEVANCE_REJECT_SCORE:
+            uncertain.append(doc)
+    return accepted, uncertain
+
+
+def _fused_rag_messages(state: State, candidates: List[Document]):
+    return fused_rag_prompt.format_messages(
+        question=state["question"], documents=_format_numbered_docs(candidates)
+    )
 
 
-def generate_from_context(state: State):
-    """Generate an answer grounded in the relevant documents."""
+def _fused_rag_update(
+    accepted: List[Document], candidates: List[Document], decision: FusedRagDecision
+):
+    # Drop out-of-range or duplicate ids the model may hallucinate
+    graded_ids = {i for i in decision.relevant_ids if 0 <= i < len(candidates)}
+    relevant_docs = [
+        doc
+        for i, doc in enumerate(candidates)
+        if i < len(accepted) or i in graded_ids
+    ]
     context = "\n\n---\n\n".join(
-        [doc.page_content for doc in state.get("relevant_docs", [])]
+        [doc.page_content for doc in relevant_docs]
     ).strip()
+    return {"relevant_docs": relevant_docs, "answer": decision.answer, "context": context}
 
-    if not context:
-        return {"answer": "No relevant document found.", "context": ""}
 
-    out = llm.invoke(
-        rag_generation_prompt.format_messages(
-            question=state["question"], context=context
-        )
+def grade_and_generate(state: State):
+    """Filter retrieved documents for relevance and answer from them in one LLM call.
+
+    Retrieval scores settle the clear cases: high scorers (or reranked docs
+    above RERANK_MIN_SCORE) are relevant without grading and low scorers never
+    reach the prompt. Only the band in between is judged by the LLM.
+    """
+    accepted, uncertain = _split_by_score(state["docs"])
+    candidates = accepted + uncertain
+    if not candidates:
+        return {"relevant_docs": [], "answer": "No relevant document found.", "context": ""}
+
+    decision: FusedRagDecision = fused_rag_llm.invoke(
+        _fused_rag_messages(state, candidates)
     )
-    return {"answer": out.content, "context": context}
+    return _fused_rag_update(accepted, candidates, decision)
+
 
+async def agrade_and_generate(state: State):
+    accepted, uncertain = _split_by_score(state["docs"])
+    candidates = accepted + uncertain
+    if not candidates:
+        return {"relevant_docs": [], "answer": "No relevant document found.", "context": ""}
 
-def is_supported(state: State):
-    """Check if the answer is grounded in the context (hallucination detection)."""
-    decision: IsSupportedDecision = issup_llm.invoke(
-        issup_prompt.format_messages(
-            question=state["question"],
-            answer=state.get("answer", ""),
-            context=state.get("context", ""),
-        )
+    decision: FusedRagDecision = await fused_rag_llm.ainvoke(
+        _fused_rag_messages(state, candidates)
     )
-    return {"is_supported": decision.issupported, "evidence": decision.evidence}
+    return _fused_rag_update(accepted, candidates, decision)
+
+
+def _grader_inputs(state: State):
+    return {
+        "question": state["question"],
+        "answer": state.get("answer", ""),
+        "context": state.get("context", ""),
+    }
+
+
+def _grades_update(grades):
+    issup: IsSupportedDecision = grades["issup"]
+    isuse: IsUSEDecision = grades["isuse"]
+    return {
+        "is_supported": issup.issupported,
+        "evidence": issup.evidence,
+        "is_use": isuse.isuse,
+        "use_reason": isuse.reason,
+    }
+
+
+def evaluate_answer(state: State):
+    """Grade grounding (IsSUP) and usefulness (IsUSE) of the answer concurrently.
+
+    Under invoke the two graders run on RunnableParallel's thread pool; under
+    ainvoke (``aevaluate_answer``) they are gathered on the event loop.
+    """
+    return _grades_update(answer_grader.invoke(_grader_inputs(state)))
+
+
+async def aevaluate_answer(state: State):
+    return _grades_update(await answer_grader.ainvoke(_grader_inputs(state)))
 
 
 def accept_answer(state: State):
@@ -107,50 +243,65 @@ def accept_answer(state: State):
     return {}
 
 
-def revise_answer(state: State):
-    """Revise the answer to use only direct quotes from context."""
-    out = llm.invoke(
-        revise_prompt.format_messages(
-            question=state["question"],
-            answer=state.get("answer", ""),
-            context=state.get("context", ""),
-        )
+def _answer_hash(answer: str) -> str:
+    return hashlib.sha256(answer.encode("utf-8")).hexdigest()
+
+
+def _revise_messages(state: State):
+    return revise_prompt.format_messages(
+        question=state["question"],
+        answer=state.get("answer", ""),
+        context=state.get("context", ""),
     )
+
+
+def _revise_update(state: State, out):
     return {
         "answer": out.content,
         "retries": state.get("retries", 0) + 1,
+        "prev_is_supported": state.get("is_supported", ""),
+        "prev_answer_hash": _answer_hash(state.get("answer", "")),
     }
 
 
-def is_use(state: State):
-    """Check if the answer is useful — does it address the actual question?"""
-    decision: IsUSEDecision = isuse_llm.invoke(
-        isuse_prompt.format_messages(
-            question=state["question"],
-            answer=state.get("answer", ""),
-        )
-    )
-    return {"is_use": decision.isuse, "use_reason": decision.reason}
+def revise_answer(state: State):
+    """Revise the answer to use only direct quotes from context."""
+    return _revise_update(state, llm.invoke(_revise_messages(state)))
 
 
-def rewrite_question(state: State):
-    """Rewrite the retrieval query for better vector search results."""
-    decision: RewriteDecision = rewrite_llm.invoke(
-        rewrite_for_retrieval_prompt.format_messages(
-            question=state["question"],
-            retrieval_query=state.get("retrieval_query", ""),
-            answer=state.get("answer", ""),
-        )
+async def arevise_answer(state: State):
+    return _revise_update(state, await llm.ainvoke(_revise_messages(state)))
+
+
+def _rewrite_messages(state: State):
+    return rewrite_for_retrieval_prompt.format_messages(
+        question=state["question"],
+        retrieval_query=state.get("retrieval_query", ""),
+        answer=state.get("answer", ""),
     )
+
+
+def _rewrite_update(state: State, decision: RewriteDecision):
     return {
         "retrieval_query": decision.retrieval_query,
         "rewrite_tries": state.get("rewrite_tries", 0) + 1,
         "docs": [],
         "relevant_docs": [],
         "context": "",
+        "prev_is_supported": "",
+        "prev_answer_hash": "",
     }
 
 
+def rewrite_question(state: State):
+    """Rewrite the retrieval query for better vector search results."""
+    return _rewrite_update(state, rewrite_llm.invoke(_rewrite_messages(state)))
+
+
+async def arewrite_question(state: State):
+    return _rewrite_update(state, await rewrite_llm.ainvoke(_rewrite_messages(state)))
+
+
 def no_answer_found(state: State):
     """Fallback node when no relevant documents are found."""
     return {"answer": "No relevant document found.", "context": ""}
@@ -167,9 +318,9 @@ def route_after_decide(state: State) -> Literal["generate_direct", "retrieve"]:
 
 def route_after_relevance(
     state: State,
-) -> Literal["generate_from_context", "no_answer_found"]:
+) -> Literal["evaluate_answer", "no_answer_found"]:
     if state.get("relevant_docs") and len(state["relevant_docs"]) > 0:
-        return "generate_from_context"
+        return "evaluate_answer"
     return "no_answer_found"
 
 
@@ -180,6 +331,12 @@ def route_after_issupported(
         return "accept_answer"
     if state.get("retries", 0) >= MAX_HALLUCINATION_RETRIES:
         return "accept_answer"
+    # The last revision changed neither the answer nor the verdict; another
+    # pass at temperature 0 would just repeat it
+    if state.get("is_supported") == state.get("prev_is_supported") and _answer_hash(
+        state.get("answer", "")
+    ) == state.get("prev_answer_hash"):
+        return "accept_answer"
     return "revise_answer"
 
 
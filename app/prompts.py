@@ -33,42 +33,42 @@ direct_generation_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-# ── Relevance Check ─────────────────────────────────────────────────────────
-is_relevant_prompt = ChatPromptTemplate.from_messages(
+# ── Relevance Check + RAG Generation (fused) ────────────────────────────────
+fused_rag_prompt = ChatPromptTemplate.from_messages(
     [
         (
             "system",
-            "You are judging document relevance.\n"
+            "You are a startup RAG assistant.\n"
+            "You are given a question and numbered documents like [0], [1], ...\n"
             "Return JSON that matches this schema:\n"
-            "{{'is_relevant': boolean}}\n\n"
-            "A document is relevant if it contains information that directly helps answer the question.",
+            "{{'relevant_ids': [int], 'answer': str}}\n\n"
+            "Steps:\n"
+            "- relevant_ids: the numbers of every document that contains information that directly helps answer the question.\n"
+            "- answer: answer the question using only the documents listed in relevant_ids.\n\n"
+            "Rules:\n"
+            "- If no document is relevant, return relevant_ids=[] and answer 'No relevant document found.'\n"
+            "- If the relevant documents do not contain enough information, answer 'No relevant document found.'\n"
+            "- Do not use outside knowledge - rely solely on the documents.\n",
         ),
-        ("human", "Question:\n{question}\n\nDocument:\n{document}"),
+        ("human", "Question:\n{question}\n\nDocuments:\n{documents}\n"),
     ]
 )
 
-# ── RAG Generation from Context ─────────────────────────────────────────────
-rag_generation_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            "You are a startup RAG assistant.\n"
-            "Answer the user's question using only the provided context.\n"
-            "If the context does not contain enough information, say:\n"
-            "'No relevant document found.'\n"
-            "Do not use outside knowledge - rely solely on the context.\n",
-        ),
-        ("human", "Question:\n{question}\n\nContext:\n{context}\n"),
-    ]
-)
+# Leading system text shared by the grounding check and the reviser. The
+# retrieved context goes first so the IsSUP -> revise -> IsSUP loop sends an
+# identical prefix on every iteration, which OpenAI's automatic prompt cache
+# reuses (once the prefix reaches 1024 tokens).
+_CONTEXT_PREFIX = "CONTEXT:\n{context}\n\n"
 
 # ── Is Supported (Hallucination Check) ───────────────────────────────────────
 issup_prompt = ChatPromptTemplate.from_messages(
     [
         (
             "system",
-            "You are verifying whether the ANSWER is supported by the CONTEXT.\n"
-            "Return JSON with keys: issupported, evidence.\n"
+            _CONTEXT_PREFIX
+            + "You are verifying whether the ANSWER is supported by the CONTEXT.\n"
+            "Return JSON that matches this schema:\n"
+            "{{'issupported': str, 'evidence': [str]}}\n"
             "issupported must be one of: fully_supported, partially_supported, not_supported.\n\n"
             "How to decide issupported:\n"
             "- fully_supported:\n"
@@ -88,10 +88,7 @@ issup_prompt = ChatPromptTemplate.from_messages(
             "- Evidence: include up to 3 short direct quotes from CONTEXT that support the supported parts.\n"
             "- Do not use outside knowledge.",
         ),
-        (
-            "human",
-            "Question:\n{question}\n\nAnswer:\n{answer}\n\nContext:\n{context}\n",
-        ),
+        ("human", "Question:\n{question}\n\nAnswer:\n{answer}\n"),
     ]
 )
 
@@ -100,7 +97,8 @@ revise_prompt = ChatPromptTemplate.from_messages(
     [
         (
             "system",
-            "You are a STRICT reviser.\n\n"
+            _CONTEXT_PREFIX
+            + "You are a STRICT reviser.\n\n"
             "You must output based on the following format:\n\n"
             "FORMAT (quote-only answer):\n"
             "- <direct quote from the CONTEXT>\n"
@@ -111,10 +109,7 @@ revise_prompt = ChatPromptTemplate.from_messages(
             "- Do NOT explain anything.\n"
             "- Do NOT say 'context', 'not mentioned', 'does not mention', 'not provided', etc.\n",
         ),
-        (
-            "human",
-            "Question:\n{question}\n\nCurrent Answer:\n{answer}\n\nCONTEXT:\n{context}",
-        ),
+        ("human", "Question:\n{question}\n\nCurrent Answer:\n{answer}"),
     ]
 )
 
@@ -126,7 +121,8 @@ isuse_prompt = ChatPromptTemplate.from_messages(
             "You are judging USEFULNESS of the ANSWER for the QUESTION.\n\n"
             "Goal:\n"
             "- Decide if the answer actually addresses what the user asked.\n\n"
-            "Return JSON with keys: isuse, reason.\n"
+            "Return JSON that matches this schema:\n"
+            "{{'isuse': str, 'reason': str}}\n"
             "isuse must be one of: useful, not_useful.\n\n"
             "Rules:\n"
             "- useful: The answer directly answers the SPECIFIC question asked using the EXACT concept/topic requested.\n"
@@ -152,7 +148,7 @@ rewrite_for_retrieval_prompt = ChatPromptTemplate.from_messages(
             "- Add 2-5 high-signal keywords that likely appear in policy/pricing docs.\n"
             "- Remove filler words.\n"
             "- Do NOT answer the question.\n"
-            "- Output JSON with key: retrieval_query\n\n"
+            "- Output JSON that matches this schema: {{'retrieval_query': str}}\n\n"
             "Examples:\n"
             "Q: 'Do NovaMind plans include a free trial?'\n"
             "-> {{'retrieval_query': 'NovaMind free trial duration trial period plans'}}\n\n"
@@ -0,0 +1,184 @@
+"""Fast-path retrieval routing that can skip the decide_retrieval LLM call."""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import hyperscan
+except ImportError:  # optional; falls back to a single compiled ``re`` pattern
+    hyperscan = None
+
+from app.config import (
+    CACHE_DIR,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    ROUTER_MARGIN,
+    embeddings,
+)
+
+logger = logging.getLogger(__name__)
+
+# ── Labeled examples (kept distinct from evals/dataset.json) ────────────────
+RETRIEVAL_EXAMPLES = [
+    "What is NovaMind AI's vacation policy?",
+    "How much does the NovaMind Pro plan cost per month?",
+    "Who leads engineering at NovaMind AI?",
+    "What security certifications does the company have?",
+    "Which products does NovaMind sell to enterprise customers?",
+    "What are the rate limits on the NovaMind API?",
+]
+DIRECT_EXAMPLES = [
+    "What is machine learning?",
+    "Explain how a transformer neural network works.",
+    "Define the term API.",
+    "What is the difference between precision and recall?",
+    "How does gradient descent optimize a model?",
+    "What does GPU stand for?",
+]
+
+# Company and product names that occur in the source PDFs; a question naming
+# one can only be answered from them. Generic business terms (pricing, policy,
+# CEO...) are deliberately absent: "What does a CEO do?" needs no retrieval,
+# so those fall through to the centroid check and then the LLM.
+RETRIEVAL_KEYWORDS = [
+    "novamind",
+    "nova-7b",
+    "nova-70b",
+    "nova-embed",
+    "nova-vision",
+    "agentos",
+]
+_KEYWORD_PATTERNS = [rf"\b{re.escape(kw)}\b" for kw in RETRIEVAL_KEYWORDS]
+
+
+def _compile_hyperscan():
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[p.encode() for p in _KEYWORD_PATTERNS],
+        ids=list(range(len(_KEYWORD_PATTERNS))),
+        elements=len(_KEYWORD_PATTERNS),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH]
+        * len(_KEYWORD_PATTERNS),
+    )
+    return db
+
+
+_hs_db = _compile_hyperscan() if hyperscan is not None else None
+# Hyperscan scratch space must not be shared between concurrent scans
+_hs_local = threading.local()
+_keyword_re = re.compile("|".join(_KEYWORD_PATTERNS), re.IGNORECASE)
+
+
+def _on_match(pattern_id, start, end, flags, hits):
+    hits.append(pattern_id)
+
+
+def has_retrieval_keyword(question: str) -> bool:
+    """Return True if ``question`` mentions any of RETRIEVAL_KEYWORDS."""
+    if _hs_db is None:
+        return _keyword_re.search(question) is not None
+
+    scratch = getattr(_hs_local, "scratch", None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_hs_db)
+    hits: List[int] = []
+    _hs_db.scan(
+        question.encode("utf-8"),
+        match_event_handler=_on_match,
+        context=hits,
+        scratch=scratch,
+    )
+    return bool(hits)
+
+
+# Unit-length centroids, row 0 = retrieve, row 1 = direct. Built on first use.
+_centroids: Optional[np.ndarray] = None
+_centroids_lock = threading.Lock()
+
+
+def _centroid(texts: List[str]) -> np.ndarray:
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+    centroid = vectors.mean(axis=0)
+    return centroid / np.linalg.norm(centroid)
+
+
+def _centroid_cache_path() -> Path:
+    # Keyed by everything the centroids depend on, so stale files are never read
+    key = hashlib.sha256(
+        json.dumps(
+            [EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, RETRIEVAL_EXAMPLES, DIRECT_EXAMPLES]
+        ).encode("utf-8")
+    ).hexdigest()[:16]
+    return CACHE_DIR / f"router_centroids_{key}.json"
+
+
+def _load_or_build_centroids() -> np.ndarray:
+    path = _centroid_cache_path()
+    if path.exists():
+        centroids = np.asarray(json.loads(path.read_text()), dtype="float32")
+        logger.info("Loaded retrieval router centroids from %s", path)
+        return centroids
+
+    centroids = np.stack([_centroid(RETRIEVAL_EXAMPLES), _centroid(DIRECT_EXAMPLES)])
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Per-process temp name: several API workers may build them at once
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(centroids.tolist()))
+        tmp.replace(path)
+    except OSError as e:
+        logger.warning("Could not cache router centroids at %s: %s", path, e)
+    logger.info("Retrieval router centroids ready")
+    return centroids
+
+
+def get_centroids() -> np.ndarray:
+    """Return the router centroids, from the on-disk cache when possible.
+
+    Persisting them saves the example embedding calls on every new process
+    (API restarts, eval CLI runs).
+    """
+    global _centroids
+    if _centroids is None:
+        # Parallel eval workers all route their first question at once
+        with _centroids_lock:
+            if _centroids is None:
+                _centroids = _load_or_build_centroids()
+    return _centroids
+
+
+def _centroid_decision(question_vector: List[float]) -> Optional[bool]:
+    q = np.asarray(question_vector, dtype="float32")
+    q /= np.linalg.norm(q)
+    retrieve_sim, direct_sim = get_centroids() @ q
+    margin = float(retrieve_sim - direct_sim)
+    if abs(margin) <= ROUTER_MARGIN:
+        return None
+    return margin > 0
+
+
+def classify_retrieval(question: str) -> Optional[bool]:
+    """Return a confident retrieval decision for ``question``, or None if ambiguous.
+
+    A RETRIEVAL_KEYWORDS hit decides retrieval without embedding anything.
+    Otherwise the question embedding is compared against the two class
+    centroids; only a cosine margin above ROUTER_MARGIN counts as confident.
+    """
+    if has_retrieval_keyword(question):
+        return True
+    return _centroid_decision(embeddings.embed_query(question))
+
+
+async def aclassify_retrieval(question: str) -> Optional[bool]:
+    """Async ``classify_retrieval``: the question embedding is awaited."""
+    if has_retrieval_keyword(question):
+        return True
+    return _centroid_decision(await embeddings.aembed_query(question))
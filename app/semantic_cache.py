@@ -0,0 +1,64 @@
+"""In-memory semantic cache that maps question embeddings to /ask responses."""
+
+import logging
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Cosine-similarity lookup over L2-normalized question embeddings.
+
+    Vectors live in a FAISS ``IndexFlatIP`` wrapped in an ``IndexIDMap2`` so
+    entries can be evicted. Once ``max_size`` entries are stored, the least
+    recently used one is dropped.
+    """
+
+    def __init__(self, threshold: float, max_size: int):
+        self.threshold = threshold
+        self.max_size = max_size
+        self._index = None
+        self._entries: "OrderedDict[int, Any]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        x = np.asarray([vector], dtype="float32")
+        faiss.normalize_L2(x)
+        return x
+
+    def lookup(self, vector: List[float]) -> Optional[Any]:
+        """Return the cached value closest to ``vector`` if it clears the threshold."""
+        if not self._entries:
+            return None
+        scores, ids = self._index.search(self._normalize(vector), 1)
+        entry_id, score = int(ids[0][0]), float(scores[0][0])
+        if entry_id < 0 or score < self.threshold:
+            return None
+        self._entries.move_to_end(entry_id)
+        logger.info("Semantic cache hit (score=%.3f)", score)
+        return self._entries[entry_id]
+
+    def add(self, vector: List[float], value: Any) -> None:
+        """Store ``value`` under ``vector``, evicting the LRU entry when full."""
+        if self.max_size <= 0:
+            return
+        x = self._normalize(vector)
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(x.shape[1]))
+
+        if len(self._entries) >= self.max_size:
+            oldest_id, _ = self._entries.popitem(last=False)
+            self._index.remove_ids(np.asarray([oldest_id], dtype="int64"))
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._index.add_with_ids(x, np.asarray([entry_id], dtype="int64"))
+        self._entries[entry_id] = value
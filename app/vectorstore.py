@@ -1,15 +1,36 @@
-"""FAISS vector store management: build, save, load, and retriever access."""
+"""FAISS vector store management: build, save, load, and scored search."""
 
+import json
 import logging
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import List, Optional
 
-from langchain_community.document_loaders import PyPDFLoader
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from app.config import (
     CHUNK_OVERLAP,
     CHUNK_SIZE,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_CONCURRENCY,
+    FAISS_INDEX_FACTORY,
+    FAISS_NPROBE,
+    FAISS_REFINE_K_FACTOR,
     PDF_FILES,
+    RERANKER_MODEL,
     TOP_K,
     VECTORSTORE_DIR,
     embeddings,
@@ -18,56 +39,316 @@ from app.config import (
 logger = logging.getLogger(__name__)
 
 # Module-level cache
-_retriever = None
+_vector_store = None
+_reranker = None
+_reranker_lock = threading.Lock()
+
+INDEX_FILE = VECTORSTORE_DIR / "index.faiss"
+DOCSTORE_FILE = VECTORSTORE_DIR / "index.pkl"
+INDEX_META_FILE = VECTORSTORE_DIR / "index.meta.json"
+
+# FAISS recommends at least this many training points per k-means centroid
+MIN_TRAIN_POINTS_PER_CENTROID = 39
+
+
+def _load_and_split(pdf_path: Path) -> List[Document]:
+    """Load one PDF and split it into chunks. Runs in a worker process."""
+    pages = PyMuPDFLoader(str(pdf_path)).load()
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    ).split_documents(pages)
+
+
+def _embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed ``texts`` as EMBED_BATCH_SIZE-sized requests sent concurrently."""
+    batches = [
+        texts[i : i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=EMBED_MAX_CONCURRENCY) as pool:
+        # map() preserves batch order, so vectors stay aligned with texts
+        results = list(pool.map(embeddings.embed_documents, batches))
+    return np.asarray([v for batch in results for v in batch], dtype="float32")
+
+
+def _build_faiss_index(vectors: np.ndarray) -> faiss.Index:
+    """Build the index described by FAISS_INDEX_FACTORY and add ``vectors`` to it.
+
+    ``vectors`` must be L2-normalized: the index uses inner-product search,
+    which then equals cosine similarity. Falls back to an exact flat index
+    when the corpus is too small to train the IVF coarse quantizer.
+    """
+    n, d = vectors.shape
+    index = faiss.index_factory(d, FAISS_INDEX_FACTORY, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        ivf = faiss.try_extract_index_ivf(index)
+        nlist = ivf.nlist if ivf is not None else 1
+        if n < MIN_TRAIN_POINTS_PER_CENTROID * nlist:
+            logger.warning(
+                "Only %d vectors to train '%s' (need >= %d). Using exact flat index.",
+                n, FAISS_INDEX_FACTORY, MIN_TRAIN_POINTS_PER_CENTROID * nlist,
+            )
+            index = faiss.IndexFlatIP(d)
+        else:
+            index.train(vectors)
+    index.add(vectors)
+    return index
 
 
 def build_index() -> FAISS:
     """Load PDFs, chunk, embed, save FAISS index to disk, and return the store."""
     logger.info("Loading PDFs from %s", [str(p) for p in PDF_FILES])
-    docs = []
+    pdf_paths = []
     for pdf_path in PDF_FILES:
         if not pdf_path.exists():
             logger.warning("PDF not found: %s", pdf_path)
             continue
-        docs.extend(PyPDFLoader(str(pdf_path)).load())
+        pdf_paths.append(pdf_path)
 
-    if not docs:
+    if not pdf_paths:
         raise FileNotFoundError("No PDFs found. Check data/pdfs/ directory.")
 
-    logger.info("Loaded %d pages. Chunking (size=%d, overlap=%d)...", len(docs), CHUNK_SIZE, CHUNK_OVERLAP)
-    chunks = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
-    ).split_documents(docs)
+    # PDF parsing is CPU-bound, so load and chunk each file in its own process
+    logger.info(
+        "Loading and chunking %d PDFs in parallel (size=%d, overlap=%d)...",
+        len(pdf_paths), CHUNK_SIZE, CHUNK_OVERLAP,
+    )
+    with ProcessPoolExecutor(max_workers=len(pdf_paths)) as pool:
+        chunks = list(chain.from_iterable(pool.map(_load_and_split, pdf_paths)))
 
-    logger.info("Created %d chunks. Building FAISS index...", len(chunks))
-    vector_store = FAISS.from_documents(chunks, embeddings)
+    if not chunks:
+        raise FileNotFoundError("No text extracted from PDFs in data/pdfs/ directory.")
 
-    VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
-    vector_store.save_local(str(VECTORSTORE_DIR))
+    logger.info(
+        "Created %d chunks. Embedding in batches of %d...", len(chunks), EMBED_BATCH_SIZE
+    )
+    vectors = _embed_texts([c.page_content for c in chunks])
+    faiss.normalize_L2(vectors)
+
+    logger.info("Building FAISS index (%s)...", FAISS_INDEX_FACTORY)
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=_build_faiss_index(vectors),
+        docstore=InMemoryDocstore({str(i): chunk for i, chunk in enumerate(chunks)}),
+        index_to_docstore_id={i: str(i) for i in range(len(chunks))},
+        normalize_L2=True,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+    )
+
+    _save_index(vector_store)
     logger.info("FAISS index saved to %s", VECTORSTORE_DIR)
 
     return vector_store
 
 
+def _save_index(vector_store: FAISS) -> None:
+    """Write the index files FAISS.save_local would, plus the metadata, atomically.
+
+    All three files are staged as temp files in VECTORSTORE_DIR first and then
+    ``os.replace``-d over the old ones back to back, so a concurrent load can
+    only see a mixed set during three renames, not during the whole write.
+    The new files get new inodes, so processes that have the old index
+    memory-mapped keep reading the old data instead of dying with SIGBUS when
+    the file is truncated under them.
+    """
+    VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
+    writers = {
+        INDEX_FILE: lambda path: faiss.write_index(vector_store.index, str(path)),
+        DOCSTORE_FILE: lambda path: path.write_bytes(
+            pickle.dumps((vector_store.docstore, vector_store.index_to_docstore_id))
+        ),
+        INDEX_META_FILE: lambda path: path.write_text(
+            json.dumps(_index_meta(vector_store.index), indent=2)
+        ),
+    }
+    staged = {}
+    try:
+        for path, write in writers.items():
+            staged[path] = tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            write(tmp)
+        for path, tmp in staged.items():
+            os.replace(tmp, path)
+    finally:
+        for tmp in staged.values():
+            tmp.unlink(missing_ok=True)
+
+
+def _index_meta(index: faiss.Index) -> dict:
+    """Describe what the saved index holds so loads can detect a mismatch."""
+    return {
+        "index_type": type(faiss.downcast_index(index)).__name__,
+        "ntotal": index.ntotal,
+        "dim": index.d,
+        "embedding_model": EMBEDDING_MODEL,
+    }
+
+
+def _read_index_meta() -> Optional[dict]:
+    """Return the saved index metadata, or None for indexes built without it."""
+    if not INDEX_META_FILE.exists():
+        return None
+    return json.loads(INDEX_META_FILE.read_text())
+
+
+def _mmap_flag(meta: Optional[dict]) -> int:
+    """Pick the FAISS mmap flag that actually maps this index type.
+
+    ``IO_FLAG_MMAP`` only maps IVF inverted lists; flat and refine codes are
+    copied into RAM unless read with ``IO_FLAG_MMAP_IFC``. The two can't be
+    combined: ``IO_FLAG_MMAP_IFC`` on an IVF index with flat lists throws.
+    Indexes saved before the type was recorded keep the IVF flag.
+    """
+    index_type = (meta or {}).get("index_type", "IndexIVF")
+    if index_type.startswith("IndexIVF"):
+        return faiss.IO_FLAG_MMAP
+    return faiss.IO_FLAG_MMAP_IFC
+
+
+def _check_index_meta(index: faiss.Index, meta: Optional[dict]) -> None:
+    """Fail fast if the index on disk doesn't match its metadata or the config.
+
+    The dimension is always checked against EMBEDDING_DIMENSIONS; otherwise a
+    mismatch only surfaces as a bare AssertionError inside ``index.search``.
+    The metadata checks are skipped for indexes built before it existed.
+    """
+    if EMBEDDING_DIMENSIONS and index.d != EMBEDDING_DIMENSIONS:
+        raise ValueError(
+            f"FAISS index at {VECTORSTORE_DIR} has dim={index.d}, but "
+            f"EMBEDDING_DIMENSIONS is {EMBEDDING_DIMENSIONS}. "
+            "Run `python -m scripts.rebuild_index`."
+        )
+    if meta is None:
+        return
+    if (index.d, index.ntotal) != (meta["dim"], meta["ntotal"]):
+        raise ValueError(
+            f"FAISS index at {VECTORSTORE_DIR} has dim={index.d}, ntotal={index.ntotal} "
+            f"but {INDEX_META_FILE.name} expects dim={meta['dim']}, "
+            f"ntotal={meta['ntotal']}. Run `python -m scripts.rebuild_index`."
+        )
+    if meta.get("embedding_model", EMBEDDING_MODEL) != EMBEDDING_MODEL:
+        raise ValueError(
+            f"FAISS index at {VECTORSTORE_DIR} was built with "
+            f"{meta['embedding_model']}, but EMBEDDING_MODEL is {EMBEDDING_MODEL}. "
+            "Run `python -m scripts.rebuild_index`."
+        )
+
+
 def load_index() -> FAISS:
-    """Load a persisted FAISS index from disk."""
-    index_file = VECTORSTORE_DIR / "index.faiss"
-    if not index_file.exists():
+    """Load a persisted FAISS index from disk.
+
+    The index file is memory-mapped read-only, so several Uvicorn workers
+    share one copy through the OS page cache instead of each loading their own.
+    The mmap flag depends on the index type recorded in ``index.meta.json``.
+    """
+    if not INDEX_FILE.exists():
         raise FileNotFoundError(
             f"No FAISS index found at {VECTORSTORE_DIR}. "
             "Run `python -m scripts.rebuild_index` first."
         )
-    logger.info("Loading FAISS index from %s", VECTORSTORE_DIR)
-    return FAISS.load_local(
-        str(VECTORSTORE_DIR), embeddings, allow_dangerous_deserialization=True
+    logger.info("Memory-mapping FAISS index from %s", VECTORSTORE_DIR)
+    meta = _read_index_meta()
+    index = faiss.read_index(str(INDEX_FILE), _mmap_flag(meta) | faiss.IO_FLAG_READ_ONLY)
+    if index.metric_type != faiss.METRIC_INNER_PRODUCT:
+        raise ValueError(
+            f"FAISS index at {VECTORSTORE_DIR} uses L2 distance; relevance scores "
+            "need the inner-product index. Run `python -m scripts.rebuild_index`."
+        )
+    _check_index_meta(index, meta)
+    # Same docstore pickle FAISS.save_local writes (trusted, produced locally)
+    with open(DOCSTORE_FILE, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        normalize_L2=True,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
     )
 
 
-def get_retriever():
-    """Return a cached retriever instance. Loads index from disk on first call."""
-    global _retriever
-    if _retriever is None:
+def get_vector_store() -> FAISS:
+    """Return the cached vector store. Loads index from disk on first call."""
+    global _vector_store
+    if _vector_store is None:
         vector_store = load_index()
-        _retriever = vector_store.as_retriever(search_kwargs={"k": TOP_K})
-        logger.info("Retriever ready (top_k=%d)", TOP_K)
-    return _retriever
+        ivf = faiss.try_extract_index_ivf(vector_store.index)
+        if ivf is not None:
+            ivf.nprobe = FAISS_NPROBE
+            logger.info("IVF index: probing %d of %d lists", FAISS_NPROBE, ivf.nlist)
+        index = faiss.downcast_index(vector_store.index)
+        if isinstance(index, faiss.IndexRefine):
+            index.k_factor = FAISS_REFINE_K_FACTOR
+        _vector_store = vector_store
+        logger.info("Vector store ready (top_k=%d)", TOP_K)
+    return _vector_store
+
+
+def _search_by_vector(query_vector: List[float], k: int) -> List[Document]:
+    vector_store = get_vector_store()
+    query_vector = np.asarray([query_vector], dtype="float32")
+    faiss.normalize_L2(query_vector)
+    scores, ids = vector_store.index.search(query_vector, k)
+
+    results: List[Document] = []
+    for score, i in zip(scores[0], ids[0]):
+        if i < 0:  # index holds fewer than k vectors
+            continue
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[int(i)])
+        results.append(
+            Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "relevance_score": float(score)},
+            )
+        )
+    return results
+
+
+def search(query: str, k: int = TOP_K) -> List[Document]:
+    """Return the top-k chunks for ``query``.
+
+    Queries the FAISS index directly with the (cached) query embedding rather
+    than going through the LangChain retriever/vector store layers. Each
+    result is a copy of the stored chunk with its cosine similarity to the
+    query in ``metadata["relevance_score"]``.
+    """
+    return _search_by_vector(embeddings.embed_query(query), k)
+
+
+async def asearch(query: str, k: int = TOP_K) -> List[Document]:
+    """Async ``search``: awaits the query embedding, then searches in-process."""
+    return _search_by_vector(await embeddings.aembed_query(query), k)
+
+
+def get_reranker():
+    """Return the cached cross-encoder reranker. Loads RERANKER_MODEL on first call."""
+    global _reranker
+    if _reranker is None:
+        # Parallel eval workers all reach retrieve at once; load the model once
+        with _reranker_lock:
+            if _reranker is None:
+                # Optional dependency, only needed when RERANKER_MODEL is set
+                from sentence_transformers import CrossEncoder
+
+                logger.info("Loading reranker %s", RERANKER_MODEL)
+                _reranker = CrossEncoder(RERANKER_MODEL)
+    return _reranker
+
+
+def rerank(query: str, docs: List[Document], k: int = TOP_K) -> List[Document]:
+    """Score all (query, doc) pairs in one cross-encoder batch and keep the top k.
+
+    Each result carries its cross-encoder score in ``metadata["rerank_score"]``.
+    """
+    if not docs:
+        return []
+    scores = get_reranker().predict(
+        [(query, doc.page_content) for doc in docs], batch_size=16
+    )
+    ranked = sorted(zip(docs, scores), key=lambda pair: pair[1], reverse=True)[:k]
+    return [
+        Document(
+            page_content=doc.page_content,
+            metadata={**doc.metadata, "rerank_score": float(score)},
+        )
+        for doc, score in ranked
+    ]
@@ -0,0 +1,30 @@
+"""Eval dataset loading shared by the local and LangSmith eval runners."""
+
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # optional; stdlib json is just slower
+    import json
+
+    _loads = json.loads
+
+EVALS_DIR = Path(__file__).resolve().parent
+DATASET_PATH = EVALS_DIR / "dataset.json"
+
+
+@lru_cache(maxsize=4)
+def _parse(path: Path, mtime_ns: int) -> tuple[dict, ...]:
+    # mtime_ns is part of the cache key so an edited file is re-read
+    return tuple(_loads(path.read_bytes()))
+
+
+def read_dataset(path: Path = DATASET_PATH) -> list[dict]:
+    """Return the questions in ``path``, parsed at most once per file version.
+
+    The question dicts are shared between callers; treat them as read-only.
+    """
+    return list(_parse(path, path.stat().st_mtime_ns))
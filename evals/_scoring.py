@@ -0,0 +1,125 @@
+"""Scoring helpers shared by the local and LangSmith eval runners."""
+
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, NamedTuple
+
+try:
+    import ahocorasick
+except ImportError:  # optional; falls back to one substring scan per keyword
+    ahocorasick = None
+
+# Phrases that mark an answer as an "I don't know" (checked for negative tests).
+# Case folding happens inside the regex engine, so answers are never lowercased.
+FALLBACK_RE = re.compile(
+    r"no relevant|not found|unable to find|don't have|do not have|not mentioned"
+    r"|no information|couldn't find|could not find|no answer|not available",
+    re.IGNORECASE,
+)
+# The graph's own refusals, which can't be hallucinations
+GRAPH_FALLBACK_RE = re.compile(
+    r"no relevant document|no answer found|unable to find", re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1024)
+def _keyword_matcher(keywords: tuple[str, ...]) -> Callable[[str], int]:
+    """Build a counter of how many ``keywords`` occur in a lowercased answer.
+
+    Built once per keyword list (the dataset is static for a run). Repeated
+    keywords count once per repetition, same as checking each list entry.
+    """
+    weights = Counter(kw.lower() for kw in keywords)
+
+    if ahocorasick is None:
+        def count(answer_lower: str) -> int:
+            return sum(n for kw, n in weights.items() if kw in answer_lower)
+
+        return count
+
+    automaton = ahocorasick.Automaton()
+    for kw, n in weights.items():
+        automaton.add_word(kw, (kw, n))
+    automaton.make_automaton()
+
+    def count(answer_lower: str) -> int:
+        # One pass over the answer; overlapping keywords are all reported
+        found = {kw: n for _, (kw, n) in automaton.iter(answer_lower)}
+        return sum(found.values())
+
+    return count
+
+
+def count_keyword_hits(expected_keywords: list[str], answer_lower: str) -> int:
+    """Return how many of ``expected_keywords`` appear in the lowercased answer."""
+    if not expected_keywords:
+        return 0
+    return _keyword_matcher(tuple(expected_keywords))(answer_lower)
+
+
+# ── Scorers ──────────────────────────────────────────────────────────────────
+SUPPORT_SCORES = {
+    "fully_supported": 1.0,
+    "partially_supported": 0.5,
+    "not_supported": 0.0,
+}
+
+
+class AnswerTokens(NamedTuple):
+    lower: str
+    is_fallback: bool
+    is_graph_fallback: bool
+
+
+@lru_cache(maxsize=4096)
+def answer_tokens(answer: str) -> AnswerTokens:
+    """Lowercase and fallback-scan ``answer`` once for all scorers.
+
+    LangSmith hands the same answer to every evaluator of an example, so
+    only the first one pays for the string work.
+    """
+    return AnswerTokens(
+        lower=answer.lower(),
+        is_fallback=FALLBACK_RE.search(answer) is not None,
+        is_graph_fallback=GRAPH_FALLBACK_RE.search(answer) is not None,
+    )
+
+
+def score_keyword_hit_rate(answer: str, expected_keywords: list[str]) -> float:
+    """Fraction of expected keywords present in the answer (1.0 if none expected)."""
+    if not expected_keywords:
+        return 1.0  # nothing to check
+    hits = count_keyword_hits(expected_keywords, answer_tokens(answer).lower)
+    return hits / len(expected_keywords)
+
+
+def detect_fallback(answer: str) -> bool:
+    """True if the answer admits it doesn't know."""
+    return answer_tokens(answer).is_fallback
+
+
+def is_graph_fallback(answer: str) -> bool:
+    """True if the answer is one of the graph's own refusals."""
+    return answer_tokens(answer).is_graph_fallback
+
+
+def score_hallucination(
+    is_supported: str, need_retrieval: bool | None, answer: str
+) -> float | None:
+    """Grounding score from the IsSUP verdict; None when nothing was retrieved.
+
+    A refusal from the graph can't be a hallucination, so it scores 1.0.
+    """
+    if not need_retrieval:
+        return None
+    if is_graph_fallback(answer):
+        return 1.0
+    return SUPPORT_SCORES.get(is_supported, 0.0)
+
+
+def score_usefulness(is_use: str, need_retrieval: bool | None) -> float | None:
+    """1.0 if the graph judged its answer useful; None when nothing was retrieved."""
+    if not need_retrieval:
+        return None
+    return 1.0 if is_use == "useful" else 0.0
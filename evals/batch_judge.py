@@ -0,0 +1,135 @@
+"""
+Offline LLM-as-judge scoring through the OpenAI Batch API.
+
+The graph's own graders (IsSUP, IsUSE) decide which node runs next, so they
+have to answer online. The reference-based judge below only scores finished
+answers, which makes it a good fit for the Batch API: half the price of
+synchronous calls, in exchange for results within the 24h completion window.
+"""
+
+import io
+import json
+import time
+
+from openai import OpenAI
+
+from app.config import LLM_MODEL, http_client
+
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+JUDGE_SYSTEM_PROMPT = (
+    "You grade answers from a question-answering system about the company NovaMind AI.\n"
+    "Return JSON that matches this schema:\n"
+    "{'correct': bool, 'reason': str}\n\n"
+    "Guidelines:\n"
+    "- correct=True if the answer states the facts the expected keywords point to.\n"
+    "- If the question is marked unanswerable, correct=True only if the answer says the "
+    "information is unavailable instead of inventing it.\n"
+    "- reason is one short sentence."
+)
+
+client = OpenAI(http_client=http_client)
+
+
+def _custom_id(qid: int) -> str:
+    return f"{qid}-judge"
+
+
+def build_requests(results: list[dict], dataset: list[dict]) -> list[dict]:
+    """Return one Batch API request line per result that produced an answer."""
+    by_id = {q["id"]: q for q in dataset}
+    requests = []
+    for r in results:
+        if r["error"]:
+            continue
+        q = by_id[r["id"]]
+        user_prompt = (
+            f"Question: {r['question']}\n"
+            f"Expected keywords: {', '.join(q.get('expected_answer_keywords', [])) or '(none)'}\n"
+            f"Unanswerable: {q.get('expected_fallback', False)}\n\n"
+            f"Answer:\n{r['answer']}"
+        )
+        requests.append(
+            {
+                "custom_id": _custom_id(r["id"]),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": LLM_MODEL,
+                    "temperature": 0,
+                    "response_format": {"type": "json_object"},
+                    "messages": [
+                        {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                },
+            }
+        )
+    return requests
+
+
+def submit_batch(requests: list[dict]) -> str:
+    """Upload ``requests`` as a JSONL file and start a batch. Returns the batch id."""
+    payload = "".join(json.dumps(req) + "\n" for req in requests).encode("utf-8")
+    input_file = client.files.create(
+        file=("judge_requests.jsonl", io.BytesIO(payload)), purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+def wait_for_batch(batch_id: str, poll_seconds: float = 30.0):
+    """Poll until the batch reaches a terminal status and return it."""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        counts = batch.request_counts
+        print(f"  ⏳ Batch {batch_id}: {batch.status} ({counts.completed}/{counts.total})")
+        time.sleep(poll_seconds)
+
+
+def fetch_verdicts(batch) -> dict[str, dict]:
+    """Return ``{custom_id: {"correct": bool, "reason": str}}`` for a finished batch."""
+    if not batch.output_file_id:
+        return {}
+    verdicts: dict[str, dict] = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        response = row.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        try:
+            verdicts[row["custom_id"]] = json.loads(content)
+        except json.JSONDecodeError:
+            continue
+    return verdicts
+
+
+def judge_results(results: list[dict], dataset: list[dict], poll_seconds: float = 30.0) -> None:
+    """Judge ``results`` through one batch and merge the verdicts in place.
+
+    Adds ``judge_correct`` (bool, or None when no verdict came back) and
+    ``judge_reason`` to every result.
+    """
+    requests = build_requests(results, dataset)
+    verdicts: dict[str, dict] = {}
+    if requests:
+        batch_id = submit_batch(requests)
+        print(f"  📦 Submitted {len(requests)} judge requests as batch {batch_id}")
+        batch = wait_for_batch(batch_id, poll_seconds=poll_seconds)
+        print(f"  📦 Batch {batch_id} {batch.status}")
+        verdicts = fetch_verdicts(batch)
+
+    for r in results:
+        verdict = verdicts.get(_custom_id(r["id"]), {})
+        correct = verdict.get("correct")
+        r["judge_correct"] = bool(correct) if correct is not None else None
+        r["judge_reason"] = verdict.get("reason", "")
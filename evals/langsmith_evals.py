@@ -8,74 +8,121 @@ and comparable in the LangSmith UI.
 Usage:
     python -m evals.langsmith_evals                              # run with default experiment name
     python -m evals.langsmith_evals --name "chunk600-topk4"      # name the experiment
-    python -m evals.langsmith_evals --upload-only                # just upload the dataset
+    python -m evals.langsmith_evals --concurrency 16             # more examples in flight
+    python -m evals.langsmith_evals --upload-only                # just sync the dataset
 """
 
 import argparse
+import hashlib
 import json
-from pathlib import Path
+import threading
+from typing import Any, Optional
 
 from langsmith import Client
+from langsmith.utils import LangSmithNotFoundError
 
 from app.config import GRAPH_RECURSION_LIMIT
 from app.graph import build_graph
-
-# ── Paths ────────────────────────────────────────────────────────────────────
-EVALS_DIR = Path(__file__).resolve().parent
-DATASET_PATH = EVALS_DIR / "dataset.json"
+from app.llm_cache import install_llm_cache
+from evals._dataset import DATASET_PATH, read_dataset
+from evals._scoring import (
+    detect_fallback,
+    is_graph_fallback,
+    score_hallucination,
+    score_keyword_hit_rate,
+    score_usefulness,
+)
 
 DATASET_NAME = "Self-RAG Eval Dataset"
 
 ls_client = Client()
 
+# One compiled graph per process, shared by every concurrent target call
+_GRAPH: Optional[Any] = None
+_GRAPH_LOCK = threading.Lock()
+
 
 # ── 1. Upload dataset to LangSmith ──────────────────────────────────────────
+def _to_example(q: dict) -> dict:
+    return {
+        "inputs": {
+            "question": q["question"],
+        },
+        "outputs": {
+            "expected_answer_keywords": q.get("expected_answer_keywords", []),
+            "expected_need_retrieval": q.get("expected_need_retrieval"),
+            "expected_fallback": q.get("expected_fallback", False),
+            "category": q.get("category", ""),
+            "difficulty": q.get("difficulty", ""),
+            "source_docs": q.get("source_docs", []),
+        },
+    }
+
+
+def _example_hash(inputs: dict, outputs: dict | None) -> str:
+    payload = json.dumps({"inputs": inputs, "outputs": outputs or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def upload_dataset() -> str:
-    """Create (or update) the eval dataset in LangSmith. Returns the dataset name."""
-    with open(DATASET_PATH) as f:
-        raw = json.load(f)
+    """Create the eval dataset in LangSmith, or sync it with dataset.json.
 
-    # Check if dataset already exists
-    try:
-        existing = ls_client.read_dataset(dataset_name=DATASET_NAME)
-        print(f"  Dataset '{DATASET_NAME}' already exists (id={existing.id}).")
-        print("  Delete it in the UI or use a new name to re-upload.")
-        return DATASET_NAME
-    except Exception:
-        pass  # dataset doesn't exist yet, create it
-
-    dataset = ls_client.create_dataset(
-        dataset_name=DATASET_NAME,
-        description="20-question eval set for NovaMind AI Self-RAG pipeline.",
-    )
+    Examples are matched by a hash of their inputs and outputs, so only new
+    or edited questions are uploaded and only removed or edited ones are
+    deleted. Returns the dataset name.
+    """
+    local = {}
+    for q in read_dataset(DATASET_PATH):
+        example = _to_example(q)
+        local[_example_hash(example["inputs"], example["outputs"])] = example
 
-    examples = []
-    for q in raw:
-        examples.append(
-            {
-                "inputs": {
-                    "question": q["question"],
-                },
-                "outputs": {
-                    "expected_answer_keywords": q.get("expected_answer_keywords", []),
-                    "expected_need_retrieval": q.get("expected_need_retrieval"),
-                    "expected_fallback": q.get("expected_fallback", False),
-                    "category": q.get("category", ""),
-                    "difficulty": q.get("difficulty", ""),
-                    "source_docs": q.get("source_docs", []),
-                },
-            }
+    try:
+        dataset = ls_client.read_dataset(dataset_name=DATASET_NAME)
+        remote = list(ls_client.list_examples(dataset_id=dataset.id))
+    except LangSmithNotFoundError:
+        dataset = ls_client.create_dataset(
+            dataset_name=DATASET_NAME,
+            description="20-question eval set for NovaMind AI Self-RAG pipeline.",
         )
-
-    ls_client.create_examples(dataset_id=dataset.id, examples=examples)
-    print(f"  ✅ Uploaded {len(examples)} examples to '{DATASET_NAME}'.")
+        remote = []
+
+    unchanged: set[str] = set()
+    stale_ids = []
+    for ex in remote:
+        h = _example_hash(ex.inputs, ex.outputs)
+        if h in local and h not in unchanged:
+            unchanged.add(h)
+        else:
+            stale_ids.append(ex.id)  # edited, removed, or a duplicate
+    new_examples = [ex for h, ex in local.items() if h not in unchanged]
+
+    # One request each, not one per example
+    if new_examples:
+        ls_client.create_examples(dataset_id=dataset.id, examples=new_examples)
+    if stale_ids:
+        ls_client.delete_examples(example_ids=stale_ids)
+
+    print(
+        f"  ✅ Synced '{DATASET_NAME}': {len(new_examples)} uploaded, "
+        f"{len(stale_ids)} removed, {len(unchanged)} unchanged."
+    )
     return DATASET_NAME
 
 
 # ── 2. Target function (what LangSmith will call per example) ────────────────
+def _get_graph():
+    """Return the process-wide compiled graph, building it on first use."""
+    global _GRAPH
+    if _GRAPH is None:
+        with _GRAPH_LOCK:
+            if _GRAPH is None:
+                _GRAPH = build_graph()
+    return _GRAPH
+
+
 def build_target():
     """Return a target function that runs the Self-RAG graph."""
-    graph = build_graph()
+    graph = _get_graph()
 
     def target(inputs: dict) -> dict:
         """Run the Self-RAG pipeline on a single question."""
@@ -106,14 +153,7 @@ def build_target():
 def keyword_hit_rate(inputs: dict, outputs: dict, reference_outputs: dict) -> dict:
     """Score: what fraction of expected keywords appear in the answer."""
     expected = reference_outputs.get("expected_answer_keywords", [])
-    answer = outputs.get("answer", "")
-
-    if not expected:
-        score = 1.0
-    else:
-        answer_lower = answer.lower()
-        hits = sum(1 for kw in expected if kw.lower() in answer_lower)
-        score = hits / len(expected)
+    score = score_keyword_hit_rate(outputs.get("answer", ""), expected)
 
     return {
         "key": "keyword_hit_rate",
@@ -142,30 +182,14 @@ def retrieval_correctness(inputs: dict, outputs: dict, reference_outputs: dict)
 
 def fallback_detection(inputs: dict, outputs: dict, reference_outputs: dict) -> dict:
     """Score: for negative tests, did the graph gracefully say 'I don't know'?"""
-    expected_fallback = reference_outputs.get("expected_fallback", False)
-    answer = outputs.get("answer", "")
-
-    if not expected_fallback:
+    if not reference_outputs.get("expected_fallback", False):
         return {
             "key": "fallback_detection",
             "score": None,
             "comment": "Not a negative test — skipped",
         }
 
-    fallback_phrases = [
-        "no relevant",
-        "not found",
-        "unable to find",
-        "don't have",
-        "do not have",
-        "not mentioned",
-        "no information",
-        "couldn't find",
-        "could not find",
-        "no answer",
-        "not available",
-    ]
-    triggered = any(phrase in answer.lower() for phrase in fallback_phrases)
+    triggered = detect_fallback(outputs.get("answer", ""))
 
     return {
         "key": "fallback_detection",
@@ -177,57 +201,28 @@ def fallback_detection(inputs: dict, outputs: dict, reference_outputs: dict) ->
 def hallucination_check(inputs: dict, outputs: dict, reference_outputs: dict) -> dict:
     """Score: was the answer fully supported by retrieved evidence?"""
     is_supported = outputs.get("is_supported", "")
-    need_retrieval = outputs.get("need_retrieval")
-
-    if not need_retrieval:
-        return {
-            "key": "hallucination_check",
-            "score": None,
-            "comment": "No retrieval path — skipped",
-        }
-
-    # If the system correctly refused to answer, that's not a hallucination
     answer = outputs.get("answer", "")
-    fallback_phrases = ["no relevant document", "no answer found", "unable to find"]
-    if any(p in answer.lower() for p in fallback_phrases):
-        return {
-            "key": "hallucination_check",
-            "score": 1.0,
-            "comment": "Fallback answer — no hallucination",
-        }
-
-    score_map = {
-        "fully_supported": 1.0,
-        "partially_supported": 0.5,
-        "not_supported": 0.0,
-    }
-    score = score_map.get(is_supported, 0.0)
+    score = score_hallucination(is_supported, outputs.get("need_retrieval"), answer)
 
-    return {
-        "key": "hallucination_check",
-        "score": score,
-        "comment": f"is_supported={is_supported}",
-    }
+    if score is None:
+        comment = "No retrieval path — skipped"
+    elif is_graph_fallback(answer):
+        comment = "Fallback answer — no hallucination"
+    else:
+        comment = f"is_supported={is_supported}"
+    return {"key": "hallucination_check", "score": score, "comment": comment}
 
 
 def usefulness_check(inputs: dict, outputs: dict, reference_outputs: dict) -> dict:
     """Score: did the Self-RAG pipeline deem its own answer useful?"""
     is_use = outputs.get("is_use", "")
-    need_retrieval = outputs.get("need_retrieval")
-
-    if not need_retrieval:
-        return {
-            "key": "usefulness_check",
-            "score": None,
-            "comment": "No retrieval path — skipped",
-        }
+    score = score_usefulness(is_use, outputs.get("need_retrieval"))
 
-    score = 1.0 if is_use == "useful" else 0.0
-    return {
-        "key": "usefulness_check",
-        "score": score,
-        "comment": f"is_use={is_use}, reason={outputs.get('use_reason', '')}",
-    }
+    if score is None:
+        comment = "No retrieval path — skipped"
+    else:
+        comment = f"is_use={is_use}, reason={outputs.get('use_reason', '')}"
+    return {"key": "usefulness_check", "score": score, "comment": comment}
 
 
 ALL_EVALUATORS = [
@@ -240,12 +235,13 @@ ALL_EVALUATORS = [
 
 
 # ── 4. Run experiment ───────────────────────────────────────────────────────
-def run_experiment(experiment_name: str = "baseline"):
+def run_experiment(experiment_name: str = "baseline", max_concurrency: int = 8):
     """Upload dataset (if needed) and run a LangSmith experiment."""
     dataset_name = upload_dataset()
 
     print(f"\n  🚀 Running experiment: '{experiment_name}'")
     print(f"  Dataset: {dataset_name}")
+    print(f"  Concurrency: {max_concurrency}")
     print(f"  Evaluators: {[e.__name__ for e in ALL_EVALUATORS]}\n")
 
     target = build_target()
@@ -255,7 +251,7 @@ def run_experiment(experiment_name: str = "baseline"):
         data=dataset_name,
         evaluators=ALL_EVALUATORS,
         experiment_prefix=experiment_name,
-        max_concurrency=2,
+        max_concurrency=max_concurrency,
     )
 
     print("\n  ✅ Experiment complete!")
@@ -275,17 +271,28 @@ def main():
         default="baseline",
         help="Experiment name (e.g., 'chunk600-topk4', 'gpt4o-run')",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Examples evaluated in parallel (default: 8). Runs are network-bound, "
+        "so wall time drops roughly linearly until OpenAI rate limits kick in; "
+        "lower it if you see 429s",
+    )
     parser.add_argument(
         "--upload-only",
         action="store_true",
-        help="Only upload the dataset, don't run the experiment",
+        help="Only sync the dataset with dataset.json, don't run the experiment",
     )
     args = parser.parse_args()
 
     if args.upload_only:
         upload_dataset()
     else:
-        run_experiment(experiment_name=args.name)
+        llm_cache = install_llm_cache()
+        run_experiment(experiment_name=args.name, max_concurrency=args.concurrency)
+        if llm_cache:
+            print(f"  LLM cache: {llm_cache.stats()}  (SELFRAG_LLM_CACHE=0 to disable)\n")
 
 
 if __name__ == "__main__":
@@ -2,37 +2,84 @@
 Evaluation runner for Self-RAG pipeline.
 
 Runs every question in evals/dataset.json through the compiled graph,
-compares results against expectations, and writes a detailed report.
+compares results against expectations, and writes a detailed report:
+one JSONL line per question as it finishes, plus a summary JSON at the end.
 
 Usage:
     python -m evals.run_evals                # run all questions
     python -m evals.run_evals --ids 1 4 7    # run specific question ids
     python -m evals.run_evals --category pricing  # run by category
+    python -m evals.run_evals --workers 16   # more questions in flight
+    python -m evals.run_evals --mode async   # asyncio fan-out via graph.astream
+    python -m evals.run_evals --mode sequential   # one question at a time
+    python -m evals.run_evals --mode batch   # + LLM judge via the OpenAI Batch API
+    python -m evals.run_evals --resume evals/results/eval_20250101_120000_000000.jsonl
 """
 
 import argparse
+import asyncio
 import json
+import os
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
+from typing import Callable
+
+from rich.progress import (
+    BarColumn,
+    MofNCompleteColumn,
+    Progress,
+    TextColumn,
+    TimeElapsedColumn,
+)
 
 from app.config import GRAPH_RECURSION_LIMIT
 from app.graph import build_graph
+from app.llm_cache import CountingSQLiteCache, install_llm_cache
+from evals._dataset import DATASET_PATH, read_dataset
+from evals._scoring import detect_fallback, score_keyword_hit_rate
+from evals.batch_judge import judge_results
 
 # ── Paths ────────────────────────────────────────────────────────────────────
 EVALS_DIR = Path(__file__).resolve().parent
-DATASET_PATH = EVALS_DIR / "dataset.json"
 RESULTS_DIR = EVALS_DIR / "results"
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
+def load_results(path: Path) -> list[dict]:
+    """Read the results already logged to a JSONL file, skipping a torn last line."""
+    results = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # partial write from a crashed run
+    return results
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def append_result(log, r: dict) -> None:
+    """Append one result line and fsync it, so a crash loses at most that line."""
+    log.write(json.dumps(r, default=str).encode("utf-8") + b"\n")
+    log.flush()
+    os.fsync(log.fileno())
+
+
 def load_dataset(
     ids: list[int] | None = None,
     category: str | None = None,
 ) -> list[dict]:
     """Load and optionally filter the eval dataset."""
-    with open(DATASET_PATH) as f:
-        dataset = json.load(f)
+    dataset = read_dataset(DATASET_PATH)
 
     if ids:
         dataset = [q for q in dataset if q["id"] in ids]
@@ -42,13 +89,12 @@ def load_dataset(
     return dataset
 
 
-def keyword_hit_rate(expected_keywords: list[str], answer: str) -> float:
-    """Return fraction of expected keywords found (case-insensitive) in answer."""
-    if not expected_keywords:
-        return 1.0  # nothing to check
-    answer_lower = answer.lower()
-    hits = sum(1 for kw in expected_keywords if kw.lower() in answer_lower)
-    return hits / len(expected_keywords)
+def _initial_state(question_data: dict) -> dict:
+    return {
+        "question": question_data["question"],
+        "retries": 0,
+        "rewrite_tries": 0,
+    }
 
 
 def evaluate_single(
@@ -56,32 +102,65 @@ def evaluate_single(
     graph,
 ) -> dict:
     """Run a single eval question and return a result dict."""
-    qid = question_data["id"]
-    question = question_data["question"]
-    expected_retrieval = question_data.get("expected_need_retrieval")
-    expected_keywords = question_data.get("expected_answer_keywords", [])
-    expected_fallback = question_data.get("expected_fallback", False)
-
-    print(f"  [{qid:>2}] {question}")
-
-    initial_state = {
-        "question": question,
-        "retries": 0,
-        "rewrite_tries": 0,
-    }
-
     t0 = time.perf_counter()
     try:
         result = graph.invoke(
-            initial_state,
+            _initial_state(question_data),
             config={"recursion_limit": GRAPH_RECURSION_LIMIT},
         )
-        elapsed = time.perf_counter() - t0
         error = None
     except Exception as e:
-        elapsed = time.perf_counter() - t0
         result = {}
         error = str(e)
+    elapsed = time.perf_counter() - t0
+    return score_result(question_data, result, elapsed, error)
+
+
+async def aevaluate_single(
+    question_data: dict,
+    graph,
+    sem: asyncio.Semaphore,
+) -> dict:
+    """Async twin of evaluate_single; ``sem`` bounds how many graphs run at once.
+
+    Streams full state snapshots to also record when the first answer was
+    drafted. Scoring still waits for the final state, since revise/rewrite
+    loops can replace that draft.
+    """
+    async with sem:
+        t0 = time.perf_counter()
+        first_answer_s = None
+        try:
+            result = {}
+            async for state in graph.astream(
+                _initial_state(question_data),
+                config={"recursion_limit": GRAPH_RECURSION_LIMIT},
+                stream_mode="values",
+            ):
+                result = state
+                if first_answer_s is None and state.get("answer"):
+                    first_answer_s = time.perf_counter() - t0
+            error = None
+        except Exception as e:
+            result = {}
+            error = str(e)
+        elapsed = time.perf_counter() - t0
+    return score_result(question_data, result, elapsed, error, first_answer_s)
+
+
+def score_result(
+    question_data: dict,
+    result: dict,
+    elapsed: float,
+    error: str | None,
+    first_answer_s: float | None = None,
+) -> dict:
+    """Compare a graph result against the question's expectations."""
+    qid = question_data["id"]
+    question = question_data["question"]
+    expected_retrieval = question_data.get("expected_need_retrieval")
+    expected_keywords = question_data.get("expected_answer_keywords", [])
+    expected_fallback = question_data.get("expected_fallback", False)
 
     answer = result.get("answer", "")
     need_retrieval = result.get("need_retrieval")
@@ -99,27 +178,10 @@ def evaluate_single(
         else None
     )
 
-    kw_rate = keyword_hit_rate(expected_keywords, answer)
+    kw_rate = score_keyword_hit_rate(answer, expected_keywords)
 
     # For negative tests, the answer should acknowledge lack of info
-    fallback_triggered = False
-    if expected_fallback:
-        fallback_phrases = [
-            "no relevant",
-            "not found",
-            "unable to find",
-            "don't have",
-            "do not have",
-            "not mentioned",
-            "no information",
-            "couldn't find",
-            "could not find",
-            "no answer",
-            "not available",
-        ]
-        fallback_triggered = any(
-            phrase in answer.lower() for phrase in fallback_phrases
-        )
+    fallback_triggered = detect_fallback(answer) if expected_fallback else False
 
     # Overall pass/fail
     passed = True
@@ -166,56 +228,153 @@ def evaluate_single(
         "retrieval_correct": retrieval_correct,
         "fallback_triggered": fallback_triggered if expected_fallback else None,
         "latency_s": round(elapsed, 2),
+        # Only measured in async mode
+        "first_answer_s": round(first_answer_s, 2) if first_answer_s is not None else None,
         "error": error,
     }
 
 
+def format_result(r: dict) -> str:
+    """Render one question's outcome as a single block."""
+    status = "✅ PASS" if r["passed"] else "❌ FAIL"
+    lines = [f"  [{r['id']:>2}] {r['question']}", f"       → {status}  ({r['latency_s']}s)"]
+    lines += [f"         ⚠ {reason}" for reason in r["fail_reasons"]]
+    return "\n".join(lines) + "\n"
+
+
+def _aggregate(results: list[dict]) -> tuple[int, float, float, dict[str, dict]]:
+    """Return (passed, avg latency, avg keyword hit rate, per-category counts)."""
+    total = len(results)
+    totals = Counter(r["category"] or "unknown" for r in results)
+    passes = Counter(r["category"] or "unknown" for r in results if r["passed"])
+    avg_latency = sum(map(itemgetter("latency_s"), results)) / total if total else 0
+    avg_kw_rate = (
+        sum(map(itemgetter("keyword_hit_rate"), results)) / total if total else 0
+    )
+    categories = {
+        cat: {"total": n, "passed": passes[cat]} for cat, n in totals.items()
+    }
+    return passes.total(), avg_latency, avg_kw_rate, categories
+
+
+async def _arun_all(
+    dataset: list[dict],
+    graph,
+    concurrency: int,
+    on_result: Callable[[dict], None],
+) -> list[dict]:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run_one(q: dict) -> dict:
+        r = await aevaluate_single(q, graph, sem)
+        on_result(r)
+        return r
+
+    # gather keeps dataset order regardless of completion order
+    return await asyncio.gather(*(run_one(q) for q in dataset))
+
+
 # ── Main ─────────────────────────────────────────────────────────────────────
 def run_evals(
     ids: list[int] | None = None,
     category: str | None = None,
+    mode: str = "threads",
+    workers: int = 8,
+    resume: Path | None = None,
+    quiet: bool = False,
+    llm_cache: CountingSQLiteCache | None = None,
 ) -> dict:
-    """Run the full evaluation suite and return the summary + individual results."""
+    """Run the full evaluation suite and return the summary + individual results.
+
+    With ``resume``, questions already logged without an error in that JSONL
+    file are skipped and new results are appended to it. Parallel modes show
+    a progress bar and only print failed questions; ``quiet`` drops the bar
+    (and passing questions in sequential mode) for CI logs. ``llm_cache``
+    hit counts, when given, are added to the summary.
+    """
     dataset = load_dataset(ids=ids, category=category)
     if not dataset:
         print("No questions matched the given filters.")
         return {}
 
+    if resume:
+        log_path = resume
+        # Errored questions are re-run and questions outside this run's
+        # --ids/--category filter left out; their old lines are simply ignored
+        wanted_ids = {q["id"] for q in dataset}
+        previous = [
+            r
+            for r in load_results(log_path)
+            if not r.get("error") and r["id"] in wanted_ids
+        ]
+        done_ids = {r["id"] for r in previous}
+        todo = [q for q in dataset if q["id"] not in done_ids]
+    else:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        # Microseconds, so runs started in the same second get separate logs
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        log_path = RESULTS_DIR / f"eval_{ts}.jsonl"
+        previous, todo = [], dataset
+
     print(f"\n{'=' * 60}")
     print(f"  Self-RAG Evaluation  |  {len(dataset)} questions")
+    if previous:
+        print(f"  Resuming {log_path.name}: {len(previous)} done, {len(todo)} to go")
     print(f"{'=' * 60}\n")
 
+    # Compiled graphs are read-only; every invoke carries its own state
     graph = build_graph()
     results: list[dict] = []
 
-    for q in dataset:
-        r = evaluate_single(q, graph)
-        status = "✅ PASS" if r["passed"] else "❌ FAIL"
-        print(f"       → {status}  ({r['latency_s']}s)")
-        if r["fail_reasons"]:
-            for reason in r["fail_reasons"]:
-                print(f"         ⚠ {reason}")
-        print()
-        results.append(r)
+    parallel = mode != "sequential"
+    progress = Progress(
+        TextColumn("  {task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+        disable=quiet or not parallel,
+    )
+
+    # Only a resumed log is appended to; a new one must not exist yet
+    with open(log_path, "ab" if resume else "xb") as log, progress:
+        if log.tell() and not _ends_with_newline(log_path):
+            log.write(b"\n")  # don't glue the next record onto a torn line
+        task = progress.add_task("Evaluating", total=len(todo))
+
+        # Every mode reports results from a single thread, so no lock needed
+        def on_result(r: dict) -> None:
+            append_result(log, r)
+            if not r["passed"] or not (parallel or quiet):
+                # Printed above the live bar rather than through it
+                progress.console.print(
+                    format_result(r), markup=False, highlight=False, emoji=False
+                )
+            progress.advance(task)
+
+        if mode == "sequential":
+            for q in todo:
+                r = evaluate_single(q, graph)
+                on_result(r)
+                results.append(r)
+        elif mode == "async":
+            results = asyncio.run(_arun_all(todo, graph, workers, on_result))
+        else:  # threads, or batch (graph runs online on threads, judge goes offline)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(evaluate_single, q, graph) for q in todo]
+                for future in as_completed(futures):
+                    r = future.result()
+                    on_result(r)
+                    results.append(r)
+
+    results = sorted(previous + results, key=lambda r: r["id"])
+
+    if mode == "batch":
+        judge_results(results, dataset)
 
     # ── Summary ──────────────────────────────────────────────────────────
     total = len(results)
-    passed = sum(1 for r in results if r["passed"])
+    passed, avg_latency, avg_kw_rate, categories = _aggregate(results)
     failed = total - passed
-    avg_latency = sum(r["latency_s"] for r in results) / total if total else 0
-    avg_kw_rate = (
-        sum(r["keyword_hit_rate"] for r in results) / total if total else 0
-    )
-
-    # Per-category breakdown
-    categories: dict[str, dict] = {}
-    for r in results:
-        cat = r["category"] or "unknown"
-        if cat not in categories:
-            categories[cat] = {"total": 0, "passed": 0}
-        categories[cat]["total"] += 1
-        if r["passed"]:
-            categories[cat]["passed"] += 1
 
     summary = {
         "timestamp": datetime.now().isoformat(),
@@ -229,6 +388,19 @@ def run_evals(
             cat: f"{v['passed']}/{v['total']}" for cat, v in categories.items()
         },
     }
+    judged = [r["judge_correct"] for r in results if r.get("judge_correct") is not None]
+    if judged:
+        summary["judge_accuracy"] = round(sum(judged) / len(judged), 2)
+        summary["judged"] = len(judged)
+    if llm_cache:
+        summary["llm_cache"] = llm_cache.stats()
+
+    if mode == "batch":
+        # Verdicts arrive after the JSONL is written, so they live in the summary
+        summary["judge"] = {
+            r["id"]: {"correct": r["judge_correct"], "reason": r["judge_reason"]}
+            for r in results
+        }
 
     report = {"summary": summary, "results": results}
 
@@ -236,18 +408,21 @@ def run_evals(
     print(f"\n{'=' * 60}")
     print(f"  RESULTS: {passed}/{total} passed ({summary['pass_rate']})")
     print(f"  Avg latency: {avg_latency:.2f}s  |  Avg keyword hit: {avg_kw_rate:.0%}")
+    if judged:
+        print(f"  LLM judge: {summary['judge_accuracy']:.0%} correct ({len(judged)} judged)")
+    if llm_cache:
+        print(f"  LLM cache: {summary['llm_cache']}  (SELFRAG_LLM_CACHE=0 to disable)")
     print(f"{'─' * 60}")
     for cat, counts in categories.items():
         print(f"  {cat:25s}  {counts['passed']}/{counts['total']}")
     print(f"{'=' * 60}\n")
 
     # ── Save to disk ─────────────────────────────────────────────────────
-    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_path = RESULTS_DIR / f"eval_{ts}.json"
-    with open(out_path, "w") as f:
-        json.dump(report, f, indent=2, default=str)
-    print(f"  Report saved → {out_path}\n")
+    summary_path = log_path.with_suffix(".summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    print(f"  Results saved → {log_path}")
+    print(f"  Summary saved → {summary_path}\n")
 
     return report
 
@@ -266,8 +441,46 @@ def main():
         type=str,
         help="Run only questions in this category",
     )
+    parser.add_argument(
+        "--mode",
+        choices=["sequential", "threads", "async", "batch"],
+        default="threads",
+        help="Run questions one at a time, on a thread pool, or as asyncio tasks "
+        "via graph.astream, which also records time to first answer (default: "
+        "threads). 'batch' runs like threads, then "
+        "grades answers with an LLM judge through the OpenAI Batch API (half "
+        "price, but may take up to 24h)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Questions in flight in threads/async/batch mode (default: 8); lower it if you hit rate limits",
+    )
+    parser.add_argument(
+        "--resume",
+        type=Path,
+        metavar="PATH",
+        help="Continue an interrupted run: skip questions already in this results "
+        ".jsonl file and append the rest to it",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="No progress bar, and only print failed questions (for CI logs)",
+    )
     args = parser.parse_args()
-    run_evals(ids=args.ids, category=args.category)
+    if args.resume and not args.resume.exists():
+        parser.error(f"--resume: {args.resume} does not exist")
+    run_evals(
+        ids=args.ids,
+        category=args.category,
+        mode=args.mode,
+        workers=args.workers,
+        resume=args.resume,
+        quiet=args.quiet,
+        llm_cache=install_llm_cache(),
+    )
 
 
 if __name__ == "__main__":
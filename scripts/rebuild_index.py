@@ -7,7 +7,7 @@ from pathlib import Path
 # Add project root to path so `app` is importable
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from app.vectorstore import build_index
+from app.vectorstore import INDEX_FILE, INDEX_META_FILE, build_index
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(name)s | %(message)s")
 
@@ -15,7 +15,9 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(name)s | %(messa
 def main():
     print("Rebuilding FAISS index from PDFs...")
     store = build_index()
-    print(f"Done. Index contains {store.index.ntotal} vectors.")
+    print(f"Done. Index contains {store.index.ntotal} vectors (dim={store.index.d}).")
+    print(f"  {INDEX_FILE}  ({INDEX_FILE.stat().st_size:,} bytes)")
+    print(f"  {INDEX_META_FILE}")
 
 
 if __name__ == "__main__":